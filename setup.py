@@ -35,6 +35,7 @@ tf_requirements = [
 
 ray_requirements = tf_requirements + [
     "ray[default]",
+    "imageio[pyav]",  # Evaluator rollout videos.
 ]
 
 dev_requirements = [
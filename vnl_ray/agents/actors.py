@@ -1,6 +1,7 @@
 """Acme agent implementations."""
 
 from typing import Callable
+import collections
 
 import numpy as np
 
@@ -53,7 +54,7 @@ class DelayedFeedForwardActor(core.Actor):
         self._policy_network = policy_network
         self._action_delay = action_delay
         if action_delay is not None:
-            self._action_queue = []
+            self._action_queue = collections.deque()
         self._observation_callback = observation_callback
 
     @tf.function
@@ -83,7 +84,7 @@ class DelayedFeedForwardActor(core.Actor):
                 action = 0 * action  # Return 0 while filling the initial queue.
             else:
                 self._action_queue.append(action)
-                action = self._action_queue.pop(0)
+                action = self._action_queue.popleft()
 
         # Return a numpy array with squeezed out batch dimension.
         return tf2_utils.to_numpy_squeeze(action)
@@ -188,7 +188,8 @@ class DMPOBuilder:
     ) -> adders.Adder:
         """Create an adder which records data generated by the actor/environment."""
         return reverb_adders.NStepTransitionAdder(
-            priority_fns={self._config.replay_table_name: lambda x: 1.0},
+            # No priority fn: uniform priority 1.0, without converting each transition to numpy.
+            priority_fns={self._config.replay_table_name: None},
             client=replay_client,
             n_step=self._config.n_step,
             discount=self._config.discount,
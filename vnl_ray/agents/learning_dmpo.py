@@ -24,6 +24,35 @@ from vnl_ray.agents.intention_network_base import IntentionNetwork
 
 # inject our wandb logger for learner only
 
+# Trailing counter of a snapshot path, e.g. ".../policy-17" or ".../policy-decoder-17".
+_SNAPSHOT_COUNTER_RE = re.compile(r"(policy-(?:only-no-obs-network-|decoder-|encoder-)?)(\d+)$")
+
+
+def _increment_snapshot_path(path: str) -> str:
+    """Bump the trailing counter of a snapshot path, e.g. ".../policy-17" -> ".../policy-18"."""
+    return _SNAPSHOT_COUNTER_RE.sub(lambda m: f"{m.group(1)}{int(m.group(2)) + 1}", path)
+
+
+def _prefetch_dataset(dataset):
+    """Overlap replay sampling with the learner step.
+
+    The replay dataset already batches and prefetches on the host; on GPU the
+    batches are also copied to the device ahead of `_step` calling `next`. Replay
+    samples are consumed in arbitrary order anyway, so determinism is dropped.
+    Plain iterators are returned unchanged.
+    """
+    if not isinstance(dataset, tf.data.Dataset):
+        return dataset
+    options = tf.data.Options()
+    options.deterministic = False
+    options.threading.private_threadpool_size = 0  # Use the shared inter-op pool.
+    options.threading.max_intra_op_parallelism = 1
+    dataset = dataset.with_options(options)
+    if tf.config.list_logical_devices("GPU"):
+        # Must be the last transformation in the pipeline.
+        dataset = dataset.apply(tf.data.experimental.prefetch_to_device("/GPU:0", buffer_size=2))
+    return dataset
+
 
 class DistributionalMPOLearner(acme.Learner):
     """Distributional MPO learner."""
@@ -59,9 +88,18 @@ class DistributionalMPOLearner(acme.Learner):
         kickstart_epsilon: float = 0.005,
         replay_server_addresses: dict = None,
         KL_weights: List[float] = (0, 0),
+        jit_compile: bool = False,
+        bfloat16_target_critic_network: Optional[snt.Module] = None,
     ):
         """
         KL_weights: list of float that specify the KL regularizer strength for the intention and action layer
+        jit_compile: whether to compile the learner update with XLA, fusing the chain of small
+            elementwise and reduction ops of the distributional MPO losses into fewer kernels.
+            Off by default: the kickstart, intention and KL paths are not known to compile
+            under XLA.
+        bfloat16_target_critic_network: optional copy of the critic built with bfloat16 variables.
+            If given, it replaces the target critic for the sampled-action value estimate (no
+            gradients flow there) and is synced from the online critic with the target critic.
         """
 
         # Store online and target networks.
@@ -88,10 +126,43 @@ class DistributionalMPOLearner(acme.Learner):
         self._target_policy_update_period = target_policy_update_period
         self._target_critic_update_period = target_critic_update_period
 
+        # Online -> target variable pairs for the periodic target network sync.
+        # The networks are already built here, so the variable sets are static.
+        self._online_policy_vars = tuple(self._policy_network.variables)
+        self._target_policy_vars = tuple(self._target_policy_network.variables)
+        self._online_critic_vars = (
+            *self._observation_network.variables,
+            *self._critic_network.variables,
+        )
+        self._target_critic_vars = (
+            *self._target_observation_network.variables,
+            *self._target_critic_network.variables,
+        )
+
+        # The bfloat16 target critic mirrors the online critic in reduced precision.
+        self._bfloat16_target_critic_network = bfloat16_target_critic_network
+        self._bfloat16_critic_sync = ()
+        if bfloat16_target_critic_network is not None:
+            self._bfloat16_critic_sync = tuple(
+                zip(self._critic_network.variables, bfloat16_target_critic_network.variables)
+            )
+
+        # A variable-free observation network (e.g. tf.identity) is the same function
+        # for online and target, which lets `_step` embed o_tm1 and o_t together.
+        self._shared_observation_network = self._observation_network is self._target_observation_network or not (
+            self._observation_network.variables or self._target_observation_network.variables
+        )
+
         # Batch dataset and create iterator.
         # Created multiple iterators for different replaybuffer sources
         # TODO(b/155086959): Fix type stubs and remove.
-        self._iterators = [iter(dataset) for dataset in datasets]  # pytype: disable=wrong-arg-types
+        self._iterators = [iter(_prefetch_dataset(dataset)) for dataset in datasets]  # pytype: disable=wrong-arg-types
+        # All replay sources share one transition spec. Its batch dimension is static
+        # (the reverb dataset drops the remainder), so the update never retraces.
+        self._transition_spec = self._iterators[0].element_spec.data
+        self._batch_size = self._transition_spec.reward.shape[0]
+        # Static size of the merged [N*B, ...] sample dimension fed to the target critic.
+        self._sample_batch_size = self._num_samples * self._batch_size
 
         self._policy_loss_module = policy_loss_module or losses.MPO(
             epsilon=1e-1,
@@ -146,11 +217,12 @@ class DistributionalMPOLearner(acme.Learner):
 
         self._replay_server_addresses = replay_server_addresses
 
-        # Expose the variables.
-        policy_network_to_expose = snt.Sequential([self._target_observation_network, self._target_policy_network])
+        # Expose the variables. The same module is snapshotted below, rather than a
+        # second Sequential over the same networks.
+        self._policy_network_to_expose = snt.Sequential([self._target_observation_network, self._target_policy_network])
         self._variables = {
             "critic": self._target_critic_network.variables,
-            "policy": policy_network_to_expose.variables,
+            "policy": self._policy_network_to_expose.variables,
         }
 
         # Create a checkpointer and snapshotter object.
@@ -188,7 +260,7 @@ class DistributionalMPOLearner(acme.Learner):
             )
 
             objects_to_save = {
-                "policy-0": snt.Sequential([self._target_observation_network, self._target_policy_network]),
+                "policy-0": self._policy_network_to_expose,
                 # "policy-only-no-obs-network-0": snt.Sequential([self._target_policy_network]), '
                 # we don't need to do kickstarting for now
             }
@@ -242,6 +314,31 @@ class DistributionalMPOLearner(acme.Learner):
             self._target_policy_network.decoder.trainable = False  # freeze the weights of decoder
             print(f"CKPTS: Decoder weight frozen.")
 
+        if bfloat16_target_critic_network is not None:
+            # Start from the (possibly restored) target critic. The bfloat16 copy is not
+            # checkpointed and is otherwise only synced at the next target critic update.
+            for src, dest in zip(self._target_critic_network.variables, bfloat16_target_critic_network.variables):
+                dest.assign(tf.cast(src, dest.dtype))
+
+        # For clarity, explicitly define which variables are trained by which loss.
+        # These sets are fixed once the networks are built; the MPO dual variables are
+        # only created on the first loss call, so they are collected in the first trace.
+        self._critic_trainable = (
+            # In this agent, the critic loss trains the observation network.
+            *self._observation_network.trainable_variables,
+            *self._critic_network.trainable_variables,
+        )
+        self._policy_trainable = tuple(self._policy_network.trainable_variables)
+        self._dual_trainable = None
+
+        self._jit_compile = jit_compile
+        self._learn = tf.function(
+            self._learn_step,
+            input_signature=[self._transition_spec],
+            jit_compile=jit_compile,
+            experimental_relax_shapes=True,
+        )
+
         # Do not record timestamps until after the first learning step is done.
         # This is to avoid including the time it takes for actors to come online and
         # fill the replay buffer.
@@ -249,55 +346,86 @@ class DistributionalMPOLearner(acme.Learner):
 
     @tf.function
     def _step(self, iterator) -> types.NestedTensor:
-        # Update target network.
-        online_policy_variables = self._policy_network.variables
-        target_policy_variables = self._target_policy_network.variables
-        online_critic_variables = (
-            *self._observation_network.variables,
-            *self._critic_network.variables,
-        )
-        target_critic_variables = (
-            *self._target_observation_network.variables,
-            *self._target_critic_network.variables,
-        )
-
-        # Make online policy -> target policy network update ops.
-        if tf.math.mod(self._num_steps, self._target_policy_update_period) == 0:
-            for src, dest in zip(online_policy_variables, target_policy_variables):
-                dest.assign(src)
-        # Make online critic -> target critic network update ops.
-        if tf.math.mod(self._num_steps, self._target_critic_update_period) == 0:
-            for src, dest in zip(online_critic_variables, target_critic_variables):
-                dest.assign(src)
-
-        self._num_steps.assign_add(1)
-
         # Get data from replay (dropping extras if any). Note there is no
         # extra data here because we do not insert any into Reverb.
 
         # multiple replay buffers implementation here.
         inputs = next(iterator)
-        transitions: types.Transition = inputs.data
+        # The iterator op cannot be compiled by XLA, so the update itself is a
+        # separate (possibly jit-compiled) function.
+        return self._learn(inputs.data)
+
+    def _embed_observation(self, observation: types.NestedTensor) -> types.NestedTensor:
+        """Online observation network forward pass with gradient checkpointing.
+
+        Its activations are recomputed on the backward pass instead of being held by the
+        gradient tape, which matters for large (e.g. visual) observation networks.
+        Skipped when the update is jit-compiled: XLA may merge the recomputed forward
+        pass with the original one, so the memory saving would not be guaranteed.
+        """
+        if self._jit_compile or not self._observation_network.trainable_variables:
+            return self._observation_network(observation)
+
+        @tf.recompute_grad
+        def forward(*flat_observation):
+            return self._observation_network(tf.nest.pack_sequence_as(observation, flat_observation))
+
+        return forward(*tf.nest.flatten(observation))
+
+    def _learn_step(self, transitions: types.Transition) -> types.NestedTensor:
+        # Make online policy -> target policy network update ops.
+        tf.cond(
+            tf.equal(tf.math.mod(self._num_steps, self._target_policy_update_period), 0),
+            lambda: tf.group(
+                *[dest.assign(src) for src, dest in zip(self._online_policy_vars, self._target_policy_vars)]
+            ),
+            tf.no_op,
+        )
+        # Make online critic -> target critic network update ops.
+        tf.cond(
+            tf.equal(tf.math.mod(self._num_steps, self._target_critic_update_period), 0),
+            lambda: tf.group(
+                *[dest.assign(src) for src, dest in zip(self._online_critic_vars, self._target_critic_vars)],
+                *[dest.assign(tf.cast(src, dest.dtype)) for src, dest in self._bfloat16_critic_sync],
+            ),
+            tf.no_op,
+        )
+
+        self._num_steps.assign_add(1)
 
         # Get batch size and scalar dtype.
-        batch_size = transitions.reward.shape[0]
+        batch_size = self._batch_size
 
         # Cast the additional discount to match the environment discount dtype.
         discount = tf.cast(self._discount, dtype=transitions.discount.dtype)
 
-        with tf.GradientTape(persistent=True) as tape:
+        with tf.GradientTape() as tape:
             # Maybe transform the observation before feeding into policy and critic.
             # Transforming the observations this way at the start of the learning
             # step effectively means that the policy and critic share observation
             # network weights.
-            o_tm1 = self._observation_network(transitions.observation)
+            if self._shared_observation_network:
+                # Online and target observation networks compute the same function, so
+                # embed o_tm1 and o_t in one forward pass over the stacked batch.
+                o_all = self._embed_observation(
+                    tf.nest.map_structure(
+                        lambda x, y: tf.concat([x, y], axis=0),
+                        transitions.observation,
+                        transitions.next_observation,
+                    )
+                )
+                o_tm1 = tf.nest.map_structure(lambda x: x[:batch_size], o_all)
+                o_t = tf.nest.map_structure(lambda x: x[batch_size:], o_all)
+            else:
+                o_tm1 = self._embed_observation(transitions.observation)
+                o_t = self._target_observation_network(transitions.next_observation)
             # Scott: This is the raw observation from the replay server. # TODO for Kickstarting, use this observation instead!
 
             # This stop_gradient prevents gradients to propagate into the target
             # observation network. In addition, since the online policy network is
             # evaluated at o_t, this also means the policy loss does not influence
             # the observation network training.
-            o_t = tf.stop_gradient(self._target_observation_network(transitions.next_observation))
+            o_t = tf.stop_gradient(o_t)
 
             # Get online and target action distributions from policy networks.
             # we calculate the losses on the online action distribution
@@ -316,18 +444,29 @@ class DistributionalMPOLearner(acme.Learner):
             tiled_o_t = tf2_utils.tile_tensor(o_t, self._num_samples)  # [N, B, ...]
 
             # Compute target-estimated distributional value of sampled actions at o_t.
-            sampled_q_t_distributions = self._target_critic_network(
-                # Merge batch dimensions; to shape [N*B, ...].
-                snt.merge_leading_dims(tiled_o_t, num_dims=2),
-                snt.merge_leading_dims(sampled_actions, num_dims=2),
-            )
+            # Merge batch dimensions; to shape [N*B, ...].
+            merged_o_t = tf.reshape(tiled_o_t, [self._sample_batch_size, *o_t.shape[1:]])
+            merged_actions = tf.reshape(sampled_actions, [self._sample_batch_size, *sampled_actions.shape[2:]])
+            if self._bfloat16_target_critic_network is not None:
+                # No gradients flow through this estimate, so it is computed in bfloat16
+                # and cast back before the reductions below.
+                bfloat16_distributions = self._bfloat16_target_critic_network(
+                    tf.cast(merged_o_t, tf.bfloat16), tf.cast(merged_actions, tf.bfloat16)
+                )
+                sampled_q_t_distributions = networks.DiscreteValuedDistribution(
+                    values=tf.cast(bfloat16_distributions.values, tf.float32),
+                    logits=tf.cast(bfloat16_distributions.logits, tf.float32),
+                )
+            else:
+                sampled_q_t_distributions = self._target_critic_network(merged_o_t, merged_actions)
 
             # Compute average logits by first reshaping them and normalizing them
             # across atoms.
             new_shape = [self._num_samples, batch_size, -1]  # [N, B, A]
             sampled_logits = tf.reshape(sampled_q_t_distributions.logits, new_shape)
-            sampled_logprobs = tf.math.log_softmax(sampled_logits, axis=-1)
-            averaged_logits = tf.reduce_logsumexp(sampled_logprobs, axis=0)
+            # Normalize in place of log_softmax so no separate log-probs tensor is kept.
+            log_norm = tf.reduce_logsumexp(sampled_logits, axis=-1, keepdims=True)
+            averaged_logits = tf.reduce_logsumexp(sampled_logits - log_norm, axis=0)
 
             # Construct the expected distributional value for bootstrapping.
             q_t_distribution = networks.DiscreteValuedDistribution(
@@ -348,7 +487,7 @@ class DistributionalMPOLearner(acme.Learner):
 
             # Compute Q-values of sampled actions and reshape to [N, B].
             sampled_q_values = sampled_q_t_distributions.mean()
-            sampled_q_values = tf.reshape(sampled_q_values, (self._num_samples, -1))
+            sampled_q_values = tf.reshape(sampled_q_values, (self._num_samples, batch_size))
 
             # Compute MPO policy loss.
             policy_loss, policy_stats = self._policy_loss_module(
@@ -364,7 +503,8 @@ class DistributionalMPOLearner(acme.Learner):
             loss_policy_teacher = 0
             # Compute the expert distillation loss
             if self._kickstart_teacher_policy is not None:
-                teacher_distribution = self._kickstart_teacher_policy(o_tm1)
+                # The distillation loss only trains the policy, not the observation network.
+                teacher_distribution = self._kickstart_teacher_policy(tf.stop_gradient(o_tm1))
                 kl_teacher_student = teacher_distribution.distribution.kl_divergence(
                     online_action_distribution.distribution
                 )
@@ -384,25 +524,22 @@ class DistributionalMPOLearner(acme.Learner):
                 policy_stats["action_KL_loss"] = KL_action_loss
                 policy_loss += KL_intention_loss + KL_action_loss
 
-        # For clarity, explicitly define which variables are trained by which loss.
-        critic_trainable_variables = (
-            # In this agent, the critic loss trains the observation network.
-            self._observation_network.trainable_variables
-            + self._critic_network.trainable_variables
-        )
-        policy_trainable_variables = self._policy_network.trainable_variables
-        # The following are the MPO dual variables, stored in the loss module.
-        dual_trainable_variables = self._policy_loss_module.trainable_variables
+        if self._dual_trainable is None:
+            # The following are the MPO dual variables, stored in the loss module.
+            self._dual_trainable = tuple(self._policy_loss_module.trainable_variables)
+        critic_trainable_variables = self._critic_trainable
+        policy_trainable_variables = self._policy_trainable
+        dual_trainable_variables = self._dual_trainable
 
         # Compute gradients.
-        critic_gradients = tape.gradient(critic_loss, critic_trainable_variables)
-        policy_gradients, dual_gradients = tape.gradient(
-            policy_loss, (policy_trainable_variables, dual_trainable_variables)
+        # The critic loss does not reach the policy or dual variables and the policy loss
+        # does not reach the critic variables, so a single backward pass over both losses
+        # yields the same per-loss gradients while sharing the common backward nodes.
+        critic_gradients, policy_gradients, dual_gradients = tape.gradient(
+            [critic_loss, policy_loss],
+            [critic_trainable_variables, policy_trainable_variables, dual_trainable_variables],
         )
 
-        # Delete the tape manually because of the persistent=True flag.
-        del tape
-
         # Maybe clip gradients.
         if self._clipping:
             policy_gradients = tuple(tf.clip_by_global_norm(policy_gradients, 40.0)[0])
@@ -437,36 +574,7 @@ class DistributionalMPOLearner(acme.Learner):
             fetches.update(counts)
 
             # Checkpoint and attempt to write the logs.
-            if self._checkpointer is not None:
-                self._checkpointer.save()
-
-            if self._snapshotter is not None:
-                if self._snapshotter.save():
-                    # Increment the snapshot counter (directly in the snapshotter's path).
-                    for path in list(self._snapshotter._snapshots.keys()):
-                        snapshot = self._snapshotter._snapshots[path]  # noqa: F841
-                        # Assume that path ends with, e.g., "/policy-17".
-                        # Find sequence of digits at end of string.
-                        current_counter = re.findall("[0-9]+$", path)[0]
-                        new_path = path.replace(
-                            "policy-only-no-obs-network-" + current_counter,
-                            "policy-only-no-obs-network-" + str(int(current_counter) + 1),
-                        )
-                        new_path = new_path.replace(
-                            "policy-" + current_counter,
-                            "policy-" + str(int(current_counter) + 1),
-                        )
-                        if isinstance(self._target_policy_network, IntentionNetwork):
-                            new_path = new_path.replace(
-                                "policy-decoder-" + current_counter,
-                                "policy-decoder-" + str(int(current_counter) + 1),
-                            )
-                            new_path = new_path.replace(
-                                "policy-encoder-" + current_counter,
-                                "policy-encoder-" + str(int(current_counter) + 1),
-                            )
-                        # Redirect snapshot to new key and delete old key.
-                        self._snapshotter._snapshots[new_path] = self._snapshotter._snapshots.pop(path)
+            self._save()
             try:
                 fetches["actor_sps"] = fetches["actor_steps"] / (
                     fetches["learner_walltime"] + 1
@@ -479,6 +587,18 @@ class DistributionalMPOLearner(acme.Learner):
                 pass
             self._logger.write(fetches)
 
+    def _save(self):
+        """Checkpoint and snapshot the learner; the savers skip until their time_delta passes."""
+        if self._checkpointer is not None:
+            self._checkpointer.save()
+
+        if self._snapshotter is not None:
+            if self._snapshotter.save():
+                # Increment the snapshot counter (directly in the snapshotter's path).
+                self._snapshotter._snapshots = {
+                    _increment_snapshot_path(path): snapshot for path, snapshot in self._snapshotter._snapshots.items()
+                }
+
     def get_variables(self, names: List[str]) -> List[List[np.ndarray]]:
         self._counter.increment(get_variables_calls=1)
         return [tf2_utils.to_numpy(self._variables[name]) for name in names]
@@ -1,17 +1,21 @@
 """Classes for DMPO agent distributed with Ray."""
 
-from typing import Iterator, Callable, List
-import socket
+from typing import Callable, List
+import collections
+import concurrent.futures
+import fractions
+import functools
 import dataclasses
-import copy
 import logging
 import os
+import random
 import wandb
 from pathlib import Path
 import re
-import imageio
+import imageio.v3 as iio
 
 import ray
+import mujoco
 import numpy as np
 
 import tensorflow as tf
@@ -21,11 +25,11 @@ import sonnet as snt
 import acme
 from acme import core
 from acme import specs
-from acme import datasets
 from acme import adders
 from acme import wrappers
 from acme.utils import counting
 from acme.utils import loggers
+from acme.tf import utils as tf2_utils
 from acme.tf import variable_utils
 from acme.tf import networks as network_utils
 from acme.adders import reverb as reverb_adders
@@ -40,12 +44,154 @@ from vnl_ray.agents.utils_tf import TestPolicyWrapper
 from matplotlib import pyplot as plt
 from io import BytesIO
 
+# Per-episode statistics aggregated by the evaluator, in stats buffer column order.
+_EVAL_STATS_KEYS = ("episode_length", "episode_return", "steps_per_second")
+# Subset of _EVAL_STATS_KEYS that also gets var/max/min aggregates.
+_EVAL_SPREAD_KEYS = ("episode_length", "episode_return")
+# Recompute evaluator aggregates every this many episodes, or on an outlier episode return.
+_EVAL_AGG_STRIDE = 10
+# Policy snapshot directories written by the learner's Snapshotter: "policy-<number>".
+_POLICY_SNAPSHOT_RE = re.compile(r"policy-(\d+)$")
+
+
+@functools.lru_cache(maxsize=None)
+def _wrap_network_factory(network_factory: Callable) -> Callable:
+    """Wraps network_factory to build agent_dmpo.DMPONetworks from its dict of networks.
+
+    Cached, so all learners/actors in a process share one wrapper per network_factory.
+    """
+
+    def wrapped_network_factory(action_spec):
+        networks_dict = network_factory(action_spec)
+        networks = agent_dmpo.DMPONetworks(
+            policy_network=networks_dict.get("policy"),
+            critic_network=networks_dict.get("critic"),
+            observation_network=networks_dict.get(
+                "observation", tf.identity
+            ),  # optionally use the user defined observation network
+            # if none is define, use the identity function.
+        )
+        return networks
+
+    return wrapped_network_factory
+
+
+def _write_video(frames, path: str, fps: float) -> str:
+    """Encodes frames to an mp4 at path; runs on the evaluator's video thread."""
+    # One (T, H, W, 3) batch handed to the encoder in a single call. PyAV wants a rational rate.
+    iio.imwrite(
+        path,
+        np.stack(frames),
+        plugin="pyav",
+        codec="libx264",
+        fps=fractions.Fraction(fps).limit_denominator(1000),
+    )
+    return path
+
+
+class _ObjectStoreVariableSource(core.VariableSource):
+    """Reads the learner's variables through the Ray object store.
+
+    Wraps the (RemoteAsLocal) learner handle for `variable_utils.VariableClient`,
+    see `Learner.get_variables_ref`.
+    """
+
+    def __init__(self, learner):
+        self._learner = learner
+
+    def get_variables(self, names: List[str]) -> List[List[np.ndarray]]:
+        return ray.get(self._learner.get_variables_ref(names))
+
+
+class _WindowStats:
+    """Mean, var, min and max over the last `size` rows, each updated in O(1) per row.
+
+    Mean and variance use Welford's update, extended to swap out the evicted row
+    once the window is full, and are recomputed exactly once per window so round-off
+    can't accumulate. Min and max use monotonic deques.
+    """
+
+    def __init__(self, size: int, num_columns: int):
+        self._size = size
+        self._buf = np.empty((size, num_columns), dtype=np.float64)
+        self._len = 0  # Number of valid rows in the buffer.
+        self._idx = 0  # Row the next add is written to (the oldest row once full).
+        self._count = 0  # Rows added so far.
+        self._mean = np.zeros(num_columns)
+        self._m2 = np.zeros(num_columns)
+        # Per column, (row count, value) pairs with decreasing (max) or increasing (min) values.
+        self._max_queues = [collections.deque() for _ in range(num_columns)]
+        self._min_queues = [collections.deque() for _ in range(num_columns)]
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def full(self) -> bool:
+        return self._len == self._size
+
+    def add(self, row):
+        row = np.asarray(row, dtype=np.float64)
+        if not self.full:
+            self._len += 1
+            delta = row - self._mean
+            self._mean = self._mean + delta / self._len
+            self._m2 = self._m2 + delta * (row - self._mean)
+        else:
+            evicted, old_mean = self._buf[self._idx], self._mean
+            self._mean = old_mean + (row - evicted) / self._size
+            self._m2 = self._m2 + (row - evicted) * (row - self._mean + evicted - old_mean)
+        self._buf[self._idx] = row
+        self._idx = (self._idx + 1) % self._size
+        if self.full and self._idx == 0:
+            self._mean, self._m2 = self._buf.mean(axis=0), self._buf.var(axis=0) * self._size
+
+        # Rows counted at or before `expired` have left the window; only the front can be one.
+        expired = self._count - self._size
+        for col, x in enumerate(row):
+            max_queue, min_queue = self._max_queues[col], self._min_queues[col]
+            while max_queue and max_queue[-1][1] <= x:
+                max_queue.pop()
+            while min_queue and min_queue[-1][1] >= x:
+                min_queue.pop()
+            max_queue.append((self._count, x))
+            min_queue.append((self._count, x))
+            if max_queue[0][0] <= expired:
+                max_queue.popleft()
+            if min_queue[0][0] <= expired:
+                min_queue.popleft()
+        self._count += 1
+
+    def mean(self) -> np.ndarray:
+        return self._mean
+
+    def var(self) -> np.ndarray:
+        return np.maximum(self._m2 / max(self._len, 1), 0.0)
+
+    def max(self) -> np.ndarray:
+        return np.array([queue[0][1] for queue in self._max_queues])
+
+    def min(self) -> np.ndarray:
+        return np.array([queue[0][1] for queue in self._min_queues])
+
+    def last(self) -> np.ndarray:
+        """Most recently added row."""
+        return self._buf[self._idx - 1]
+
+    def rows(self) -> np.ndarray:
+        """Rows in the window, oldest first."""
+        if not self.full:
+            return self._buf[: self._len].copy()
+        return np.roll(self._buf, -self._idx, axis=0)
+
 
 @dataclasses.dataclass
 class DMPOConfig:
     num_actors: int = 32
     batch_size: int = 256
     prefetch_size: int = 4
+    dataset_num_parallel_calls: int | None = None  # Reverb streams, split across servers. None: min(12, #cpus).
+    merged_replay_dataset: bool = False  # One mixed batch per step() instead of one update per replay server.
     min_replay_size: int = 10_000
     max_replay_size: int = 4_000_000
     samples_per_insert: float = 32.0  # None: limiter = reverb.rate_limiters.MinSize()
@@ -80,6 +226,8 @@ class DMPOConfig:
     kickstart_epsilon: float = (0.005,)
     eval_average_over: int = (200,)  # how many steps of statistic to average over in evaluator.
     KL_weights: List[float] = (0.0, 0.0)
+    jit_compile: bool = False  # whether to compile the learner update with XLA (opt-in).
+    bfloat16_target_critic: bool = False  # whether to bootstrap with a bfloat16 copy of the target critic.
 
 
 class ReplayServer:
@@ -113,10 +261,9 @@ class ReplayServer:
         )
 
         self._replay_server = reverb.Server(tables=[replay_buffer], port=None)
-        # Get hostname and port of the server.
-        hostname = socket.gethostname()
-        ip_address = socket.gethostbyname(hostname)
-        print("DEBUG: ", hostname, ip_address)
+        # Get IP address (known to Ray, no DNS lookup) and port of the server.
+        ip_address = ray.util.get_node_ip_address()
+        logging.debug("Replay server IP address: %s", ip_address)
         port = self._replay_server.port
         self._replay_server_address = f"{ip_address}:{port}"
 
@@ -144,29 +291,42 @@ class Learner(DistributionalMPOLearner):
         # self._reverb_client = reverb.Client(replay_server_address)
         self._reverb_clients = [reverb.Client(addr) for addr in replay_server_addresses.values()]
         self._label = label
-
-        def wrapped_network_factory(action_spec):
-            networks_dict = network_factory(action_spec)
-            networks = agent_dmpo.DMPONetworks(
-                policy_network=networks_dict.get("policy"),
-                critic_network=networks_dict.get("critic"),
-                observation_network=networks_dict.get(
-                    "observation", tf.identity
-                ),  # optionally use the user defined observation network
-                # if none is define, use the identity function.
-            )
-            return networks
+        wrapped_network_factory = _wrap_network_factory(network_factory)
 
         # Create the networks to optimize (online) and target networks.
         online_networks = wrapped_network_factory(environment_spec.actions)
-        target_networks = copy.deepcopy(online_networks)
-        # Initialize the networks.
+        target_networks = wrapped_network_factory(environment_spec.actions)
+        # Initialize the networks, and start the target networks from the online weights.
         online_networks.init(environment_spec)
         target_networks.init(environment_spec)
+        for network in ["observation_network", "policy_network", "critic_network"]:
+            # The observation network may be tf.identity, without variables.
+            tf.nest.map_structure(
+                lambda target, online: target.assign(online),
+                tuple(getattr(getattr(target_networks, network), "variables", ())),
+                tuple(getattr(getattr(online_networks, network), "variables", ())),
+            )
 
-        datasets = [
-            self._make_dataset_iterator(c) for c in self._reverb_clients
-        ]  # (SY) add multiple reverbe client here
+        bfloat16_target_critic = None
+        if self._config.bfloat16_target_critic:
+            # Same critic architecture, built on bfloat16 inputs so its variables are bfloat16.
+            # Only the critic is taken from the factory; its other modules are never built.
+            embedding_spec = tf2_utils.create_variables(
+                online_networks.observation_network, [environment_spec.observations]
+            )
+            bfloat16_target_critic = network_factory(environment_spec.actions)["critic"]
+            tf2_utils.create_variables(
+                bfloat16_target_critic,
+                [
+                    tf.TensorSpec(embedding_spec.shape, tf.bfloat16),
+                    tf.TensorSpec(environment_spec.actions.shape, tf.bfloat16),
+                ],
+            )
+
+        if self._config.merged_replay_dataset:
+            datasets = [self._make_dataset(self._reverb_clients)]  # (SY) one pipeline over all reverb clients
+        else:
+            datasets = [self._make_dataset([c]) for c in self._reverb_clients]  # (SY) one pipeline per reverb client
         counter = counting.Counter(parent=counter, prefix=label)
         if self._config.logger is None:
             logger = loggers.make_default_logger(
@@ -225,14 +385,18 @@ class Learner(DistributionalMPOLearner):
             KL_weights=self._config.KL_weights,
             load_decoder_only=self._config.load_decoder_only,
             froze_decoder=self._config.froze_decoder,
+            jit_compile=self._config.jit_compile,
+            bfloat16_target_critic_network=bfloat16_target_critic,
         )
 
+        # Variables put in the Ray object store, keyed by variable names. Cleared
+        # whenever the variables change, see `get_variables_ref`.
+        self._variables_refs = {}
+
     def _step(self, iterator):
-        # Workaround to access _step in DistributionalMPOLearner:
-        # @tf.function
-        # def _step(self)
-        #    ...
-        return DistributionalMPOLearner._step(self, iterator)
+        # Bound through super(), the base class tf.function keeps one trace cache per
+        # learner instead of taking `self` as a traced argument on every call.
+        return super()._step(iterator)
 
     def run(self, num_steps=None):
         del num_steps  # Not used.
@@ -240,6 +404,18 @@ class Learner(DistributionalMPOLearner):
         # to process calls to `get_variables`.
         for _ in range(self._config.num_learner_steps):
             self.step()
+        self._variables_refs.clear()  # Publish the updated variables on the next request.
+
+    def get_variables_ref(self, names: List[str]) -> ray.ObjectRef:
+        """Like `get_variables`, but returns a Ray object store reference to them.
+
+        The variables are copied to the object store at most once per `run`, however
+        many actors ask for them, and actors on the same node read that one copy.
+        """
+        key = tuple(names)
+        if key not in self._variables_refs:
+            self._variables_refs[key] = ray.put(self.get_variables(names))
+        return self._variables_refs[key]
 
     def isready(self):
         """Dummy method to check if learner is ready."""
@@ -251,18 +427,45 @@ class Learner(DistributionalMPOLearner):
             return self._checkpointer._checkpoint_dir, self._snapshotter.directory
         return None, None
 
-    def _make_dataset_iterator(
+    def _make_dataset(
         self,
-        reverb_client: reverb.Client,
-    ) -> Iterator[reverb.ReplaySample]:
-        """Create a dataset iterator to use for learning/updating the agent."""
-        dataset = datasets.make_reverb_dataset(
-            table=self._config.replay_table_name,
-            server_address=reverb_client.server_address,
-            batch_size=self._config.batch_size,
-            prefetch_size=self._config.prefetch_size,
-        )
-        return iter(dataset)
+        reverb_clients: List[reverb.Client],
+    ) -> tf.data.Dataset:
+        """Create a dataset to use for learning/updating the agent.
+
+        Each server is sampled by several reverb streams in parallel. Given several
+        servers, they are read in turn and the samples are batched after that, so
+        every batch mixes all servers. The learner does one update per dataset and
+        step(), so a merged dataset samples each table at 1/N of the per-server rate.
+        """
+        num_parallel_calls = self._config.dataset_num_parallel_calls or min(12, os.cpu_count() or 1)
+        streams_per_server = max(1, num_parallel_calls // len(self._reverb_clients))
+
+        def _make_server_dataset(server_address):
+            def _make_stream(_):
+                return reverb.TrajectoryDataset.from_table_signature(
+                    server_address=server_address,
+                    table=self._config.replay_table_name,
+                    max_in_flight_samples_per_worker=2 * self._config.batch_size,
+                )
+
+            return tf.data.Dataset.range(streams_per_server).interleave(
+                _make_stream,
+                cycle_length=streams_per_server,
+                num_parallel_calls=tf.data.AUTOTUNE,
+                deterministic=False,
+            )
+
+        server_datasets = [_make_server_dataset(c.server_address) for c in reverb_clients]
+        if len(server_datasets) == 1:
+            dataset = server_datasets[0]
+        else:
+            # Round-robin over the servers.
+            dataset = tf.data.experimental.choose_from_datasets(
+                server_datasets, tf.data.Dataset.range(len(server_datasets)).repeat()
+            )
+        dataset = dataset.batch(self._config.batch_size, drop_remainder=True)
+        return dataset.prefetch(self._config.prefetch_size)
 
 
 class EnvironmentLoop(acme.EnvironmentLoop):
@@ -295,9 +498,9 @@ class EnvironmentLoop(acme.EnvironmentLoop):
                     running_on_head_node = True
                     break
             if running_on_head_node:
-                egl_device_id = np.random.choice(egl_device_id_head_node)
+                egl_device_id = random.choice(egl_device_id_head_node)
             else:
-                egl_device_id = np.random.choice(egl_device_id_worker_node)
+                egl_device_id = random.choice(egl_device_id_worker_node)
             os.environ["MUJOCO_EGL_DEVICE_ID"] = str(egl_device_id)
 
         assert actor_or_evaluator in ["actor", "evaluator"]
@@ -314,17 +517,8 @@ class EnvironmentLoop(acme.EnvironmentLoop):
         environment = environment_factory()
         environment_spec = specs.make_environment_spec(environment)
 
-        def wrapped_network_factory(action_spec):
-            networks_dict = network_factory(action_spec)
-            networks = agent_dmpo.DMPONetworks(
-                policy_network=networks_dict.get("policy"),
-                critic_network=networks_dict.get("critic"),
-                observation_network=networks_dict.get("observation", tf.identity),
-            )
-            return networks
-
         # Create the policy network, adder, ...
-        networks = wrapped_network_factory(environment_spec.actions)
+        networks = _wrap_network_factory(network_factory)(environment_spec.actions)
         networks.init(environment_spec)
 
         if actor_or_evaluator == "actor":
@@ -375,7 +569,7 @@ class EnvironmentLoop(acme.EnvironmentLoop):
             else:
                 logger_kwargs = {}
             if actor_or_evaluator == "evaluator":
-                print(f"Evaluator Node for Logger! Task Name: {task_name}")
+                logging.debug("Evaluator Node for Logger! Task Name: %s", task_name)
             logger = self._config.logger(
                 label=label,
                 time_delta=self._config.log_every,
@@ -390,11 +584,19 @@ class EnvironmentLoop(acme.EnvironmentLoop):
             self._snapshotter_dir = Path(snapshotter_dir)
         self._latest_snapshot = None
         self._highest_snap_num = -1
+        self._snap_dir_mtime = -1  # Snapshot dir mtime (ns) at the last scan.
+        # Rollout videos are encoded in the background and logged once written.
+        self._video_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._pending_renders = collections.deque()
         self._task_name = task_name
         self._environment_factory = environment_factory
+        self._render_env = None  # Environment for rollout videos, built on first render.
 
-        # for evaluator logging support for mean
-        self._stats = []
+        # for evaluator logging support for mean: running stats over the last
+        # eval_average_over episodes, one column per key in _EVAL_STATS_KEYS.
+        self._stats = _WindowStats(self._config.eval_average_over, len(_EVAL_STATS_KEYS))
+        self._agg_cache = {}  # Last aggregates reported by _eval_agg_stat, keyed by include_raw.
+        self._agg_cache_step = 0  # Aggregated episodes since the window filled up.
 
         super().__init__(environment, actor, counter, logger)
 
@@ -402,14 +604,15 @@ class EnvironmentLoop(acme.EnvironmentLoop):
         """Add rendering support for evaluator, and added aggregate stats"""
         try:
             logging_data = super().run_episode()
-        except Exception as e:
+        except (reverb.errors.DeadlineExceededError, mujoco.FatalError, RuntimeError) as e:
+            # Only drop the episode on replay timeouts and simulation/rendering failures
+            # (dm_control's PhysicsError is a RuntimeError); anything else is a real bug.
             print(f"Exception: {e} encountered in run_episode. Returned Null result for this episode.")
-            return {"episode_length": 0, "episode_return": 0, "steps_per_second": 0}  # TODO: This might causes error.
+            # Zeros keep acme's run loop going; returning before the evaluator stats keeps
+            # this episode out of the aggregates.
+            return {"episode_length": 0, "episode_return": 0, "steps_per_second": 0}
         if self._actor_or_evaluator == "evaluator":
-            self._stats.append(logging_data)
-            # self.stats is a [t1_data, t2_data, ...] array.
-            if len(self._stats) >= self._config.eval_average_over:
-                self._stats.pop(0)  # pop out the stats
+            self._stats.add([logging_data[key] for key in _EVAL_STATS_KEYS])
             self.load_snapshot_and_render(logging_data)
             logging_data.update(self._eval_agg_stat(True))  # update in place
         return logging_data
@@ -418,25 +621,33 @@ class EnvironmentLoop(acme.EnvironmentLoop):
         """
         For evaluators, calculates the aggregate statistics such as
         avg episode return, avg episode length, and avg sps
+        over the last eval_average_over episodes.
 
-        _I am sorry, but this is some very hard to read list comprehension._
+        Once the window is full the aggregates barely move between episodes, so
+        they are recomputed only every _EVAL_AGG_STRIDE episodes, or when the last
+        episode return is more than 2 std away from the mean; otherwise the last
+        aggregates are reported again.
         """
         agg = {}
-        stats_key = ["episode_length", "episode_return"]
-        if len(self._stats) >= self._config.eval_average_over:  # only report summary statistic one a while
-            avg = {
-                f"avg_{key}": np.mean([d[key] for d in self._stats])
-                for key in ["episode_length", "episode_return", "steps_per_second"]
-            }
-            var = {f"var_{key}": np.var([d[key] for d in self._stats]) for key in stats_key}
-            maxi = {f"max_{key}": np.max([d[key] for d in self._stats]) for key in stats_key}
-            mini = {f"min_{key}": np.min([d[key] for d in self._stats]) for key in stats_key}
-            agg.update(avg)
-            agg.update(var)
-            agg.update(maxi)
-            agg.update(mini)
+        if self._stats.full:  # only report summary statistic one a while
+            avg, var = self._stats.mean(), self._stats.var()
+            self._agg_cache_step += 1
+            i = _EVAL_STATS_KEYS.index("episode_return")
+            outlier = abs(self._stats.last()[i] - avg[i]) > 2 * np.sqrt(var[i])
+            if include_raw in self._agg_cache and self._agg_cache_step % _EVAL_AGG_STRIDE != 0 and not outlier:
+                return self._agg_cache[include_raw]
+            maxi, mini = self._stats.max(), self._stats.min()
+            for i, key in enumerate(_EVAL_STATS_KEYS):
+                agg[f"avg_{key}"] = avg[i]
+            for key in _EVAL_SPREAD_KEYS:
+                i = _EVAL_STATS_KEYS.index(key)
+                agg[f"var_{key}"] = var[i]
+                agg[f"max_{key}"] = maxi[i]
+                agg[f"min_{key}"] = mini[i]
             if include_raw:
-                agg.update({f"curr_{key}": np.array([d[key] for d in self._stats]) for key in stats_key})
+                stats = self._stats.rows()
+                agg.update({f"curr_{key}": stats[:, _EVAL_STATS_KEYS.index(key)] for key in _EVAL_SPREAD_KEYS})
+            self._agg_cache[include_raw] = agg
         return agg
 
     def load_snapshot_and_render(self, logging_data):
@@ -444,15 +655,22 @@ class EnvironmentLoop(acme.EnvironmentLoop):
         Check the snapshot directory, renders whenever there is a
         new policy snapshot, optionally send it to wandb. Modify the logging_data dict in place
         """
+        self._log_finished_renders(logging_data)
         render = False
-        for path in self._snapshotter_dir.iterdir():
-            match = re.match(r"policy-(\d+)", path.name)  # Look for the pattern "policy-number"
-            if match:
-                number = int(match.group(1))
-                if number > self._highest_snap_num:
-                    self._highest_snap_num = number
-                    self._latest_snapshot = path
-                    render = True
+        # New snapshots are new entries, which bump the directory mtime; skip the scan otherwise.
+        snap_dir_mtime = os.stat(self._snapshotter_dir).st_mtime_ns
+        if snap_dir_mtime == self._snap_dir_mtime:
+            return
+        self._snap_dir_mtime = snap_dir_mtime
+        with os.scandir(self._snapshotter_dir) as entries:
+            for entry in entries:
+                match = _POLICY_SNAPSHOT_RE.match(entry.name)  # Look for the pattern "policy-number"
+                if match:
+                    number = int(match.group(1))
+                    if number > self._highest_snap_num:
+                        self._highest_snap_num = number
+                        self._latest_snapshot = entry.path
+                        render = True
         if render:
             videos_path = self._snapshotter_dir.parent / "videos"
             videos_path.mkdir(parents=True, exist_ok=True)
@@ -466,16 +684,24 @@ class EnvironmentLoop(acme.EnvironmentLoop):
                 # sometime, the snapshotter will take a while to store the object. If the evaluator is
                 print(f"Policy Loading Error: {e}. Skipping rendering for this policy.")
                 self._highest_snap_num -= 1  # retry rendering the next iter.
+                self._snap_dir_mtime = -1  # rescan even if no new snapshot shows up.
                 return
             # TODO: adapt the reward plotting to each task. Currently adapted: imitation/run-gaps
-            env = self._environment_factory()
-            env = wrappers.SinglePrecisionWrapper(env)
-            env = wrappers.CanonicalSpecWrapper(env, clip=False)
+            if self._render_env is None:
+                # Built once and reused; render_with_rewards resets it before each rollout.
+                env = self._environment_factory()
+                env = wrappers.SinglePrecisionWrapper(env)
+                self._render_env = wrappers.CanonicalSpecWrapper(env, clip=False)
+            env = self._render_env
             frames = render_with_rewards(env, policy, rollout_length=50 * 30)
-            with imageio.get_writer(rendering_path, fps=1 / env.control_timestep()) as video:
-                for f in frames:
-                    video.append_data(f)
-            logging_data["rollout"] = wandb.Video(rendering_path, format="mp4")
+            self._pending_renders.append(
+                self._video_pool.submit(_write_video, frames, rendering_path, 1 / env.control_timestep())
+            )
+
+    def _log_finished_renders(self, logging_data):
+        """Attach the most recent finished rollout video, if any, to logging_data."""
+        while self._pending_renders and self._pending_renders[0].done():
+            logging_data["rollout"] = wandb.Video(self._pending_renders.popleft().result(), format="mp4")
 
     def isready(self):
         """Dummy method to check if actor is ready."""
@@ -492,7 +718,7 @@ class EnvironmentLoop(acme.EnvironmentLoop):
         if variable_source:
             # Create the variable client responsible for keeping the actor up-to-date.
             variable_client = variable_utils.VariableClient(
-                client=variable_source,
+                client=_ObjectStoreVariableSource(variable_source),
                 variables={"policy": policy_network.variables},
                 update_period=self._config.actor_update_period,  # was: hard-coded 1000,
             )
@@ -514,7 +740,8 @@ class EnvironmentLoop(acme.EnvironmentLoop):
     def _make_adder(self, replay_client: reverb.Client) -> adders.Adder:
         """Create an adder which records data generated by the actor/environment."""
         return reverb_adders.NStepTransitionAdder(
-            priority_fns={self._config.replay_table_name: lambda x: 1.0},
+            # No priority fn: uniform priority 1.0, without converting each transition to numpy.
+            priority_fns={self._config.replay_table_name: None},
             client=replay_client,
             n_step=self._config.n_step,
             discount=self._config.discount,
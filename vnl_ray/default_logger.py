@@ -14,7 +14,10 @@
 
 """Default logger."""
 
+import atexit
 import logging
+import queue
+import threading
 from typing import Any, Callable, Mapping, Optional
 import nanoid
 
@@ -27,22 +30,49 @@ from acme.utils.loggers import csv
 from acme.utils.loggers import filters
 from acme.utils.loggers import terminal
 
+# Queue sentinel telling the WandBLogger thread to stop.
+_CLOSE = object()
+
 
 class WandBLogger(base.Logger):
-    """Weights & Biases logger."""
+    """Weights & Biases logger.
+
+    `write` only enqueues the data; a background thread sends it with `wandb.log`,
+    in order, so the learner/evaluator doesn't wait on wandb serialization.
+    Unless `close` is called first, the queue is drained and the run finished at exit.
+    """
 
     def __init__(self, wandb) -> None:
         self.wandb = wandb
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
         super().__init__()
 
+    def _drain(self):
+        while True:
+            data = self._queue.get()
+            try:
+                if data is _CLOSE:
+                    return
+                self.wandb.log(data)
+            except Exception:  # Keep draining; a failed log shouldn't stall the queue.
+                logging.exception("wandb.log failed.")
+            finally:
+                self._queue.task_done()
+
     def write(self, data: base.LoggingData):
-        self.wandb.log(data)
+        self._queue.put(data)
 
     def close(self):
+        atexit.unregister(self.close)
+        self._queue.put(_CLOSE)
+        self._thread.join()
         self.wandb.finish()
 
     def flush(self):
-        pass
+        self._queue.join()
 
 
 def make_default_logger(
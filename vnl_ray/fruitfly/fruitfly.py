@@ -26,9 +26,9 @@ _ACTION_CLASSES = col.OrderedDict(adhesion=0, head=0, mouth=0, antennae=0, wings
 
 
 def neg_quat(quat_a):
-    """Returns neg(quat_a)."""
+    """Returns neg(quat_a), as a new array of the same dtype, by flipping the sign of the scalar part."""
     quat_b = quat_a.copy()
-    quat_b[0] *= -1
+    np.negative(quat_b[..., 0], out=quat_b[..., 0])
     return quat_b
 
 
@@ -317,6 +317,13 @@ class FruitFly(legacy_base.Walker):
             else:
                 self._action_indices[act_class] = []
 
+        # Flat action -> ctrl index map for apply_action.
+        keys = [k for k, indices in self._action_indices.items() if self._ctrl_indices[k] and indices]
+        self._mj_action_indices = np.array([i for k in keys for i in self._action_indices[k]], dtype=int)
+        self._mj_ctrl_indices = np.array([i for k in keys for i in self._ctrl_indices[k]], dtype=int)
+        # Reused ctrl buffer, sized to physics.model.nu on first use.
+        self._ctrl = np.zeros(0)
+
         super()._build()
 
         # Initialize previous action.
@@ -480,16 +487,16 @@ class FruitFly(legacy_base.Walker):
     def apply_action(self, physics, action, random_state):
         """Apply action to walker's actuators."""
         del random_state  # Unused.
-        if not self.mjcf_model.find_all("actuator"):
+        if not self.actuators:
             return
         # Update previous action.
-        self._prev_action[:] = action
-        # Apply MuJoCo actions.
-        ctrl = np.zeros(physics.model.nu)
-        for key, indices in self._action_indices.items():
-            if self._ctrl_indices[key] and indices:
-                ctrl[self._ctrl_indices[key]] = action[indices]
-        physics.set_control(ctrl)
+        np.copyto(self._prev_action, action)
+        # Apply MuJoCo actions. Only the mapped entries of the buffer are ever
+        # written, so the rest stay zero across steps.
+        if self._ctrl.shape[0] != physics.model.nu:
+            self._ctrl = np.zeros(physics.model.nu)
+        self._ctrl[self._mj_ctrl_indices] = action[self._mj_action_indices]
+        physics.set_control(self._ctrl)
 
     # -------------------------------------------------------------------------
 
@@ -536,8 +543,19 @@ class FruitFlyObservables(legacy_base.WalkerObservables):
         self._walker = walker
         self._buffer_size = buffer_size
         self._eye_camera_size = eye_camera_size
+        # (model, per-geom mask of walker geoms), see _is_walker_geom.
+        self._walker_geoms = (None, None)
         super().__init__(walker)
 
+    def _is_walker_geom(self, physics):
+        """Returns a per-geom mask of walker geoms, computed once per compiled model."""
+        model, is_walker_geom = self._walker_geoms
+        if model is not physics.model:
+            walker_id = physics.model.name2id("walker/", "body")
+            is_walker_geom = physics.model.body_rootid[physics.model.geom_bodyid] == walker_id
+            self._walker_geoms = (physics.model, is_walker_geom)
+        return is_walker_geom
+
     @composer.observable
     def thorax_height(self):
         """Observe the thorax height."""
@@ -622,18 +640,16 @@ class FruitFlyObservables(legacy_base.WalkerObservables):
     @composer.observable
     def actuator_activation(self):
         """Observe the actuator activation."""
-        model = self._entity.mjcf_model
-        return observable.MJCFFeature("act", model.find_all("actuator"))
+        return observable.MJCFFeature("act", self._entity.actuators)
 
     @composer.observable
     def appendages_pos(self):
         """Equivalent to end_effectors_pos but may include other appendages."""
 
         def relative_pos_in_egocentric_frame(physics):
-            appendages = physics.bind(self._entity.appendages).xpos
-            torso_pos = physics.bind(self._entity.root_body).xpos
-            torso_mat = np.reshape(physics.bind(self._entity.root_body).xmat, (3, 3))
-            return np.reshape(np.dot(appendages - torso_pos, torso_mat), -1)
+            torso = physics.bind(self._entity.root_body)
+            rel_pos = physics.bind(self._entity.appendages).xpos - torso.xpos
+            return np.dot(rel_pos, torso.xmat.reshape(3, 3)).ravel()
 
         return observable.Generic(relative_pos_in_egocentric_frame)
 
@@ -642,16 +658,12 @@ class FruitFlyObservables(legacy_base.WalkerObservables):
         """Returns the sum of self-contact forces."""
 
         def sum_body_contact_forces(physics):
-            walker_id = physics.model.name2id("walker/", "body")
+            is_walker_geom = self._is_walker_geom(physics)
+            contact = physics.data.contact
+            # Both geoms must be descendants of the thorax.
+            self_contact_ids = np.flatnonzero(is_walker_geom[contact.geom1] & is_walker_geom[contact.geom2])
             force = np.array((0.0))
-            for contact_id, contact in enumerate(physics.data.contact):
-                # Both geoms must be descendants of the thorax.
-                body1 = physics.model.geom_bodyid[contact.geom1]
-                body2 = physics.model.geom_bodyid[contact.geom2]
-                root1 = physics.model.body_rootid[body1]
-                root2 = physics.model.body_rootid[body2]
-                if not (root1 == walker_id and root2 == walker_id):
-                    continue
+            for contact_id in self_contact_ids:
                 contact_force, _ = physics.data.contact_force(contact_id)
                 force += np.linalg.norm(contact_force)
             return force
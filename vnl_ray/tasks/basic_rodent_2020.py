@@ -53,6 +53,18 @@ _CONTROL_TIMESTEP = 0.02
 _PHYSICS_TIMESTEP = 0.001
 GHOST_OFFSET = np.array((0, 0, 0))
 
+
+@functools.lru_cache(maxsize=None)
+def _clip_ids(path: str) -> tuple:
+    """Returns the clip ids (top-level keys) of the reference HDF5 file at path.
+
+    Cached per path, so building many environments from the same reference file
+    (e.g. one per actor) only opens it once to list the clips.
+    """
+    with h5py.File(path, "r") as f:
+        return tuple(f.keys())
+
+
 # Normalize the Observation space -- Namely adding additional
 # dummy origin and dummy task logic to the agent
 
@@ -246,11 +258,9 @@ def rodent_walk_imitation(
 
     TEST_FILE_PATH = ref_path
 
-    with h5py.File(TEST_FILE_PATH, "r") as f:
-        dataset_keys = tuple(f.keys())
-        dataset = types.ClipCollection(
-            ids=dataset_keys,
-        )
+    dataset = types.ClipCollection(
+        ids=_clip_ids(TEST_FILE_PATH),
+    )
 
     # Set up the mocap tracking task
     task = tracking.MultiClipMocapTracking(
@@ -291,11 +301,9 @@ def walk_humanoid(
     TEST_FILE_PATH = os.path.join(TEST_FILE_DIR, ref_path)
     test_data = resources.GetResourceFilename(TEST_FILE_PATH)
 
-    with h5py.File(TEST_FILE_PATH, "r") as f:
-        dataset_keys = tuple(f.keys())
-        dataset = types.ClipCollection(
-            ids=dataset_keys,
-        )
+    dataset = types.ClipCollection(
+        ids=_clip_ids(TEST_FILE_PATH),
+    )
 
     # Set up the mocap tracking task
     task = tracking.MultiClipMocapTracking(
@@ -335,11 +343,9 @@ def walk_rendering(
     TEST_FILE_PATH = os.path.join(TEST_FILE_DIR, ref_path)
     test_data = resources.GetResourceFilename(TEST_FILE_PATH)
 
-    with h5py.File(TEST_FILE_PATH, "r") as f:
-        dataset_keys = tuple(f.keys())
-        dataset = types.ClipCollection(
-            ids=dataset_keys,
-        )
+    dataset = types.ClipCollection(
+        ids=_clip_ids(TEST_FILE_PATH),
+    )
 
     # Set up the mocap tracking task
     task = tracking.MultiClipMocapTracking(
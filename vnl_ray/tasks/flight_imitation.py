@@ -17,6 +17,9 @@ from vnl_ray.tasks.task_utils import (
 from vnl_ray.tasks.constants import _TERMINAL_HEIGHT
 from vnl_ray.tasks.base import Flying
 
+# Reference orientation for the root quaternion reward (ref_root_quat is relative).
+_IDENTITY_QUAT = np.array([1.0, 0, 0, 0])
+
 
 class FlightImitationWBPG(Flying):
     """WBPG-based flight tracking task."""
@@ -48,6 +51,8 @@ class FlightImitationWBPG(Flying):
         self._terminal_com_dist = terminal_com_dist
         self._trajectory_sites = trajectory_sites
         self._next_traj_idx = None
+        # Ghost root offset, padded with zeros for the quaternion part of qpos.
+        self._ghost_offset_with_quat = np.hstack((self._ghost_offset, 4 * [0]))
 
         # Add axis crosshair.
         self._crosshair_sites = []
@@ -78,7 +83,7 @@ class FlightImitationWBPG(Flying):
         # Maybe add trajectory sites, one every 10 steps.
         if self._trajectory_sites:
             self._n_traj_sites = (round(self._time_limit / self.control_timestep) + 1) // 10
-            add_trajectory_sites(self.root_entity, self._n_traj_sites, group=1)
+            self._traj_sites = add_trajectory_sites(self.root_entity, self._n_traj_sites, group=1)
 
         # Explicitly add tracking task observables.
         self._walker.observables.add_observable("ref_displacement", self.ref_displacement)
@@ -110,12 +115,7 @@ class FlightImitationWBPG(Flying):
 
         # Update positions of trajectory sites.
         if self._trajectory_sites:
-            update_trajectory_sites(
-                self.root_entity,
-                self._ref_qpos,
-                self._n_traj_sites,
-                self._traj_timesteps,
-            )
+            update_trajectory_sites(self._traj_sites, self._ref_qpos, self._traj_timesteps)
         # Update axis crosshair position.
         z = self._ref_qpos[0, 2]
         self._crosshair_sites[0].fromto[[2, 5]] = [0, z + 0.5]
@@ -129,8 +129,10 @@ class FlightImitationWBPG(Flying):
             check_termination, get_reward_factors, get_discount
         """
         super().initialize_episode(physics, random_state)
+        # Walker's attachment body, for subtree_com lookups in get_reward_factors.
+        self._walker_body_id = physics.model.name2id("walker/", "body")
 
-        ghost_qpos = self._ref_qpos[0, :] + np.hstack((self._ghost_offset, 4 * [0]))
+        ghost_qpos = self._ref_qpos[0, :] + self._ghost_offset_with_quat
         self._ghost.set_pose(physics, ghost_qpos[:3], ghost_qpos[3:])
 
         # Reset wing pattern generator and get initial wing qpos.
@@ -160,7 +162,7 @@ class FlightImitationWBPG(Flying):
 
         # Update ghost joint pos and vel.
         step = int(np.round(physics.data.time / self.control_timestep))
-        ghost_qpos = self._ref_qpos[step, :] + np.hstack((self._ghost_offset, 4 * [0]))
+        ghost_qpos = self._ref_qpos[step, :] + self._ghost_offset_with_quat
         self._ghost.set_pose(physics, ghost_qpos[:3], ghost_qpos[3:])
         self._ghost.set_velocity(physics, self._ref_qvel[step, :3], self._ref_qvel[step, 3:])
 
@@ -172,7 +174,7 @@ class FlightImitationWBPG(Flying):
         # Reference CoM displacement reward.
         ghost_xpos, ghost_quat = self._ghost.get_pose(physics)
         ghost_com = root2com(np.concatenate((ghost_xpos, ghost_quat)))
-        model_com = physics.named.data.subtree_com["walker/"]
+        model_com = physics.data.subtree_com[self._walker_body_id]
         displacement = np.linalg.norm(ghost_com - model_com)
         displacement = rewards.tolerance(
             displacement,
@@ -184,7 +186,7 @@ class FlightImitationWBPG(Flying):
 
         # Reference root quaternion displacement reward.
         quat = self.observables["walker/ref_root_quat"](physics)[0]
-        quat_dist = quat_dist_short_arc(np.array([1.0, 0, 0, 0]), quat)
+        quat_dist = quat_dist_short_arc(_IDENTITY_QUAT, quat)
         quat_dist = rewards.tolerance(
             quat_dist,
             bounds=(0, 0),
@@ -27,16 +27,23 @@ import numpy as np
 from vnl_ray.tasks.tracking_old import ReferencePosesTask
 
 
+# Constant values of the dummy observables below, shared across steps (read-only).
+_DUMMY_TASK_LOGIC = np.array([0])
+_DUMMY_TASK_LOGIC.setflags(write=False)
+_DUMMY_ORIGIN = np.array([0.0, 0.0, 0.0])
+_DUMMY_ORIGIN.setflags(write=False)
+
+
 # add dummy task_logic observations
 def dummy_task_logic(physics):
     del physics
-    return np.array([0])
+    return _DUMMY_TASK_LOGIC
 
 
 # add dummy origin observations
 def dummy_origin(physics):
     del physics
-    return np.array([0.0, 0.0, 0.0])
+    return _DUMMY_ORIGIN
 
 
 class EscapeSameObs(Escape):
@@ -4,10 +4,14 @@
 
 from typing import Sequence, Callable, Any, List
 from collections import OrderedDict
+import re
 import numpy as np
 
-from vnl_ray.quaternions import rotate_vec_with_quat
 from vnl_ray.agents.utils_intention import get_rodent_egocentric_obs_key
+from vnl_ray.fruitfly.fruitfly import neg_quat  # noqa: F401  Re-exported for the fly tasks.
+
+_TRAJ_SITE_RGBA_SHOWN = (0, 1, 1, 0.5)
+_TRAJ_SITE_RGBA_HIDDEN = (0, 1, 1, 0.0)
 
 
 def get_random_policy(
@@ -78,40 +82,43 @@ def canonical2real(action: np.ndarray, action_spec: "acme.types.NestedSpec", cli
 
 def make_ghost_fly(walker, visible=True, visible_legs=True):
     """Create a 'ghost' fly to serve as a tracking target."""
-    # Remove model elements.
-    for tendon in walker.mjcf_model.find_all("tendon"):
-        tendon.remove()
-    for joint in walker.mjcf_model.find_all("joint"):
-        joint.remove()
-    for act in walker.mjcf_model.find_all("actuator"):
-        act.remove()
-    for sensor in walker.mjcf_model.find_all("sensor"):
+    mjcf_model = walker.mjcf_model
+    # Remove model elements outside of the kinematic tree.
+    for element in (
+        *mjcf_model.tendon.all_children(),
+        *mjcf_model.actuator.all_children(),
+        *mjcf_model.contact.all_children(),
+    ):
+        element.remove()
+    for sensor in mjcf_model.sensor.all_children():
         if sensor.tag == "touch" or sensor.tag == "force":
             sensor.remove()
-    for exclude in walker.mjcf_model.find_all("contact"):
-        exclude.remove()
-    all_bodies = walker.mjcf_model.find_all("body")
-    for body in all_bodies:
-        if body.name and body.name.startswith("wing"):
-            body.remove()
-    for light in walker.mjcf_model.find_all("light"):
-        light.remove()
-    for camera in walker.mjcf_model.find_all("camera"):
-        camera.remove()
-    for site in walker.mjcf_model.find_all("site"):
-        site.rgba = (0, 0, 0, 0)
-    # Disable contacts, possibly make invisible.
-    for geom in walker.mjcf_model.find_all("geom"):
-        # alpha=0.999 ensures grey ghost reference.
-        # for alpha=1.0 there is no visible difference between real walker and
-        # ghost reference.
-        if not visible_legs and any_substr_in_str(["coxa", "femur", "tibia", "tarsus", "claw"], geom.name):
-            rgba = (0, 0, 0, 0)
-        else:
-            rgba = (0.5, 0.5, 0.5, 0.2 if visible else 0.0)
-        geom.set_attributes(user=(0,), contype=0, conaffinity=0, rgba=rgba)
-        if geom.mesh is None:
-            geom.remove()
+    # Single walk over the kinematic tree, dispatching on element tag.
+    # alpha=0.999 ensures grey ghost reference.
+    # for alpha=1.0 there is no visible difference between real walker and
+    # ghost reference.
+    ghost_rgba = (0.5, 0.5, 0.5, 0.2 if visible else 0.0)
+    elements = list(mjcf_model.worldbody.all_children())
+    while elements:
+        element = elements.pop()
+        if element.tag == "body":
+            if element.name and element.name.startswith("wing"):
+                element.remove()
+            else:
+                elements.extend(element.all_children())
+        elif element.tag in ("joint", "freejoint", "light", "camera"):
+            element.remove()
+        elif element.tag == "site":
+            element.rgba = (0, 0, 0, 0)
+        elif element.tag == "geom":
+            # Disable contacts, possibly make invisible.
+            if not visible_legs and _FLY_LEG_PARTS_RE.search(element.name):
+                rgba = (0, 0, 0, 0)
+            else:
+                rgba = ghost_rgba
+            element.set_attributes(user=(0,), contype=0, conaffinity=0, rgba=rgba)
+            if element.mesh is None:
+                element.remove()
 
 
 def retract_wings(physics: "mjcf.Physics", prefix: str = "walker/", roll=0.7, pitch=-1.0, yaw=1.5) -> None:
@@ -123,34 +130,32 @@ def retract_wings(physics: "mjcf.Physics", prefix: str = "walker/", roll=0.7, pi
 
 
 def add_trajectory_sites(root_entity, n_traj_sites, group=4):
-    """Adds trajectory sites to root entity."""
-    for i in range(n_traj_sites):
+    """Adds trajectory sites to root entity.
+
+    Returns:
+        List of the added site elements, to be passed to update_trajectory_sites.
+    """
+    return [
         root_entity.mjcf_model.worldbody.add(
             element_name="site",
             name=f"traj_{i}",
             size=(0.005, 0.005, 0.005),
-            rgba=(0, 1, 1, 0.5),
+            rgba=_TRAJ_SITE_RGBA_SHOWN,
             group=group,
         )
+        for i in range(n_traj_sites)
+    ]
 
 
-def update_trajectory_sites(root_entity, ref_qpos, n_traj_sites, traj_timesteps):
-    """Updates trajectory sites"""
-    for i in range(n_traj_sites):
-        site = root_entity.mjcf_model.worldbody.find("site", f"traj_{i}")
+def update_trajectory_sites(traj_sites, ref_qpos, traj_timesteps):
+    """Updates trajectory sites returned by add_trajectory_sites."""
+    for i, site in enumerate(traj_sites):
         if i < traj_timesteps // 10:
             site.pos = ref_qpos[10 * i, :3]
-            site.rgba[3] = 0.5
+            site.rgba = _TRAJ_SITE_RGBA_SHOWN
         else:
             # Hide extra sites beyond current trajectory length, if any.
-            site.rgba[3] = 0.0
-
-
-def neg_quat(quat_a):
-    """Returns neg(quat_a)."""
-    quat_b = quat_a.copy()
-    quat_b[0] *= -1
-    return quat_b
+            site.rgba = _TRAJ_SITE_RGBA_HIDDEN
 
 
 def any_substr_in_str(substrings: Sequence[str], string: str) -> bool:
@@ -158,36 +163,73 @@ def any_substr_in_str(substrings: Sequence[str], string: str) -> bool:
     return any(s in string for s in substrings)
 
 
+def build_substr_matcher(substrings: Sequence[str]) -> re.Pattern:
+    """Compiles substrings into a single pattern for repeated checks.
+
+    `matcher.search(string)` is truthy iff any_substr_in_str(substrings, string).
+    """
+    if not substrings:
+        return re.compile("(?!)")  # Never matches.
+    return re.compile("|".join(map(re.escape, substrings)))
+
+
+# Geom name substrings of fly leg parts.
+_FLY_LEG_PARTS_RE = build_substr_matcher(("coxa", "femur", "tibia", "tarsus", "claw"))
+
+
 def qpos_name2id(physics: "mjcf.Physics") -> dict:
     """Mapping from qpos (joint) names to qpos ids.
     Returns dict of `joint_name: [id(s)]` for physics.data.qpos."""
+    # Number of qpos entries per joint type: free, ball, slide, hinge.
+    qpos_len = {0: 7, 1: 4, 2: 1, 3: 1}
+    jnt_qposadr = physics.model.jnt_qposadr
+    jnt_type = physics.model.jnt_type
     name2id_map = {}
-    idx = 0
     for j in range(physics.model.njnt):
         joint_name = physics.model.id2name(j, "joint")
-        qpos_slice = physics.named.data.qpos[joint_name]
-        name2id_map[joint_name] = [*range(idx, idx + len(qpos_slice))]
-        idx += len(qpos_slice)
+        start = jnt_qposadr[j]
+        name2id_map[joint_name] = [*range(start, start + qpos_len[jnt_type[j]])]
     return name2id_map
 
 
+def _rotate_offset(offset, quat):
+    """Rotates a fixed offset vector by orientation quaternion(s).
+
+    Same result as quaternions.rotate_vec_with_quat(offset, quat), computed with two cross
+    products instead of two Hamilton products and a reciprocal.
+
+    Args:
+        offset: Vector to rotate, (3,).
+        quat: Orientation quaternion(s), does not have to be normalized, (B, 4).
+
+    Returns:
+        Rotated offset, (B, 3).
+    """
+    quat = quat / np.linalg.norm(quat, axis=-1, keepdims=True)
+    w, u = quat[..., :1], quat[..., 1:]
+    t = 2 * np.cross(u, offset)
+    return offset + w * t + np.cross(u, t)
+
+
 def root2com(root_qpos, offset=None):
     """Get fly CoM in world coordinates using fixed offset from fly's
     root joint.
 
     This function is inverse of com2root.
 
+    Any number of batch dimensions is supported.
+
     Args:
-        root_qpos: qpos of root joint (pos & quat) in world coordinates, (7,).
+        root_qpos: qpos of root joint (pos & quat) in world coordinates, (B, 7).
         offset: CoM's offset from root in local thorax coordinates.
 
     Returns:
-        CoM position in world coordinates, (3,).
+        CoM position in world coordinates, (B, 3).
     """
     if offset is None:
         offset = np.array([-0.03697732, 0.00029205, -0.0142447])
-    offset_global = rotate_vec_with_quat(offset, root_qpos[3:])
-    com = root_qpos[:3] + offset_global
+    offset_global = _rotate_offset(offset, root_qpos[..., 3:])
+    com = root_qpos[..., :3] + offset_global
     return com
 
 
@@ -208,7 +250,7 @@ def com2root(com, quat, offset=None):
     """
     if offset is None:
         offset = np.array([-0.03697732, 0.00029205, -0.0142447])
-    offset_global = rotate_vec_with_quat(-offset, quat)
+    offset_global = _rotate_offset(-offset, quat)
     root_pos = com + offset_global
     return root_pos
 
@@ -73,6 +73,7 @@ class VisionFlightImitationWBPG(Flying):
         # Dummy initialization.
         self._target_height = 0.0
         self._target_speed = 0.0
+        self._task_input = np.zeros(2)
 
         self._target_zaxis = None
         self._ncol = None
@@ -105,6 +106,8 @@ class VisionFlightImitationWBPG(Flying):
 
         self._target_height = random_state.uniform(*self._target_height_range)
         self._target_speed = random_state.uniform(*self._target_speed_range)
+        # Constant within the episode; returned as is by the task_input observable.
+        self._task_input = np.hstack([self._target_height, self._target_speed])
 
         theta = np.deg2rad(self._body_pitch_angle)
         self._target_zaxis = np.array([np.sin(theta), 0, np.cos(theta)])
@@ -247,6 +250,6 @@ class VisionFlightImitationWBPG(Flying):
 
         def get_task_input(physics: "mjcf.Physics"):
             del physics
-            return np.hstack([self._target_height, self._target_speed])
+            return self._task_input
 
         return observable.Generic(get_task_input)
@@ -77,7 +77,7 @@ class WalkImitation(Walking):
         # Maybe add trajectory sites, one every 10 steps.
         if self._trajectory_sites:
             self._n_traj_sites = (round(self._time_limit / self.control_timestep) + 1) // 10
-            add_trajectory_sites(self.root_entity, self._n_traj_sites, group=1)
+            self._traj_sites = add_trajectory_sites(self.root_entity, self._n_traj_sites, group=1)
 
         # Additional task observables for tracking reference fly.
         self._walker.observables.add_observable("ref_displacement", self.ref_displacement)
@@ -104,12 +104,7 @@ class WalkImitation(Walking):
 
         # Update positions of trajectory sites.
         if self._trajectory_sites:
-            update_trajectory_sites(
-                self.root_entity,
-                self._ref_qpos,
-                self._n_traj_sites,
-                self._episode_steps,
-            )
+            update_trajectory_sites(self._traj_sites, self._ref_qpos, self._episode_steps)
 
     def initialize_episode(self, physics: "mjcf.Physics", random_state: np.random.RandomState):
         """Randomly selects a starting point and set the walker."""
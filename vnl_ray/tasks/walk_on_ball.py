@@ -43,9 +43,21 @@ class WalkOnBall(Walking):
         if claw_friction is not None:
             self._walker.mjcf_model.find("default", "adhesion-collision").geom.friction = (claw_friction,)
 
+        # (model, qvel slice of the ball joint), see _ball_qvel.
+        self._ball_dofs = (None, None)
+
         # Enable task-specific observables.
         self._walker.observables.add_observable("ball_qvel", self.ball_qvel)
 
+    def _ball_qvel(self, physics: "mjcf.Physics") -> np.ndarray:
+        """Returns the ball joint qvel, resolving its dof slice once per compiled model."""
+        model, dofs = self._ball_dofs
+        if model is not physics.model:
+            dofadr = physics.model.jnt_dofadr[physics.model.name2id("ball", "joint")]
+            dofs = slice(dofadr, dofadr + 3)  # Ball joint has 3 dofs.
+            self._ball_dofs = (physics.model, dofs)
+        return physics.data.qvel[dofs]
+
     def initialize_episode_mjcf(self, random_state: np.random.RandomState):
         super().initialize_episode_mjcf(random_state)
         # Maybe do something here.
@@ -61,7 +73,7 @@ class WalkOnBall(Walking):
     def get_reward_factors(self, physics):
         """Returns factorized reward terms."""
 
-        ball_qvel = physics.named.data.qvel["ball"]
+        ball_qvel = self._ball_qvel(physics)
         target_ball_qvel = [0.0, -5, 0]
         qvel = rewards.tolerance(
             ball_qvel - target_ball_qvel,
@@ -83,6 +95,6 @@ class WalkOnBall(Walking):
         """Simple observable of ball rotational velocity."""
 
         def get_ball_qvel(physics: "mjcf.Physics"):
-            return physics.named.data.qvel["ball"]
+            return self._ball_qvel(physics)
 
         return observable.Generic(get_ball_qvel)